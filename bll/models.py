@@ -1,4 +1,6 @@
-﻿import uuid
+﻿import itertools
+import random
+import uuid
 from abc import ABC
 
 class Entity(ABC):
@@ -24,69 +26,214 @@ class Answer(Entity):
         return cls(data['text'], data['is_correct'], data['id'])
 
 class Question(Entity):
-    def __init__(self, text: str, id: str = None):
+    def __init__(self, text: str, id: str = None, tag: str = None, difficulty: int = None):
         super().__init__(id)
         self.text = text
-        self.answers: list[Answer] = []
+        self.tag = tag
+        self.difficulty = difficulty
+        self._test: "Test | None" = None
+        self._position = 0
+        self._answers: list[Answer] = []
+        self.correct_count = 0
+
+    @property
+    def answers(self) -> tuple[Answer, ...]:
+        return tuple(self._answers)
+
+    @answers.setter
+    def answers(self, answers: list[Answer]):
+        self._answers = list(answers)
+        self.correct_count = sum(1 for ans in self._answers if ans.is_correct)
+        self._notify()
 
     def add_answer(self, answer: Answer):
-        self.answers.append(answer)
+        self._answers.append(answer)
+        if answer.is_correct:
+            self.correct_count += 1
+        self._notify()
+
+    def remove_answer(self, answer: Answer):
+        self._answers.remove(answer)
+        if answer.is_correct:
+            self.correct_count -= 1
+        self._notify()
+
+    def set_classification(self, tag: str = None, difficulty: int = None):
+        self.tag = tag
+        self.difficulty = difficulty
+        if self._test is not None:
+            self._test._strata.clear()
+
+    def set_answer_correct(self, answer: Answer, is_correct: bool):
+        if answer.is_correct != is_correct:
+            self.correct_count += 1 if is_correct else -1
+            answer.is_correct = is_correct
+        self._notify()
+
+    def _notify(self):
+        if self._test is not None:
+            self._test._refresh_question(self)
 
     def to_dict(self):
         data = super().to_dict()
         data.update({
             "text": self.text,
-            "answers": [ans.to_dict() for ans in self.answers]
+            "tag": self.tag,
+            "difficulty": self.difficulty,
+            "answers": [ans.to_dict() for ans in self._answers]
         })
         return data
 
     @classmethod
     def from_dict(cls, data):
-        question = cls(data['text'], data['id'])
+        question = cls(data['text'], data['id'], data.get('tag'), data.get('difficulty'))
         question.answers = [Answer.from_dict(ans_data) for ans_data in data['answers']]
         return question
 
 class Test(Entity):
-    def __init__(self, title: str, time_per_question: int = 60, id: str = None):
+    STRATIFY_FIELDS = ("tag", "difficulty")
+
+    def __init__(self, title: str, time_per_question: int = 60, id: str = None,
+                 questions_per_attempt: int = None, stratify_by: str = None):
         super().__init__(id)
         self.title = title
         self.time_per_question = time_per_question
-        self.questions: list[Question] = []
+        self.questions_per_attempt = questions_per_attempt
+        self._stratify_by = None
+        self.stratify_by = stratify_by
+        self._questions: list[Question] = []
+        self._without_answers: dict[str, Question] = {}
+        self._without_correct: dict[str, Question] = {}
+        self._strata: dict[str, dict] = {}
+        self._positions = itertools.count()
+
+    @property
+    def stratify_by(self) -> str | None:
+        return self._stratify_by
+
+    @stratify_by.setter
+    def stratify_by(self, stratify_by: str | None):
+        if stratify_by is not None and stratify_by not in self.STRATIFY_FIELDS:
+            raise ValueError(f"Невідоме поле для стратифікації: {stratify_by}")
+        self._stratify_by = stratify_by
+
+    @property
+    def questions(self) -> tuple[Question, ...]:
+        return tuple(self._questions)
+
+    @questions.setter
+    def questions(self, questions: list[Question]):
+        for q in self._questions:
+            q._test = None
+        self._questions = []
+        self._strata.clear()
+        self._without_answers.clear()
+        self._without_correct.clear()
+        for q in questions:
+            self.add_question(q)
 
     def add_question(self, question: Question):
-        self.questions.append(question)
+        question._test = self
+        question._position = next(self._positions)
+        self._questions.append(question)
+        self._strata.clear()
+        self._refresh_question(question)
+
+    def remove_question(self, question: Question):
+        self._questions.remove(question)
+        self._strata.clear()
+        question._test = None
+        self._without_answers.pop(question.id, None)
+        self._without_correct.pop(question.id, None)
+
+    def _refresh_question(self, question: Question):
+        self._without_answers.pop(question.id, None)
+        self._without_correct.pop(question.id, None)
+        if not question._answers:
+            self._without_answers[question.id] = question
+        elif question.correct_count == 0:
+            self._without_correct[question.id] = question
+
+    def find_invalid_question(self, allow_unanswered: bool = False) -> Question | None:
+        candidates = list(self._without_correct.values())
+        if not allow_unanswered:
+            candidates.extend(self._without_answers.values())
+        return min(candidates, key=lambda q: q._position, default=None)
+
+    def draw_questions(self, count: int = None, stratify_by: str = None) -> list[Question]:
+        count = count if count is not None else self.questions_per_attempt
+        stratify_by = stratify_by or self.stratify_by
+        total = len(self._questions)
+        if not count or count >= total:
+            count = total
+
+        if stratify_by is None:
+            return [self._questions[i] for i in random.sample(range(total), count)]
+
+        strata = self._get_strata(stratify_by)
+        quotas = {key: count * len(group) // total for key, group in strata.items()}
+        remaining = count - sum(quotas.values())
+        by_remainder = sorted(strata, key=lambda key: count * len(strata[key]) % total, reverse=True)
+        for key in by_remainder[:remaining]:
+            quotas[key] += 1
+
+        drawn = []
+        for key, quota in quotas.items():
+            group = strata[key]
+            drawn.extend(group[i] for i in random.sample(range(len(group)), quota))
+        random.shuffle(drawn)
+        return drawn
+
+    def _get_strata(self, field: str) -> dict:
+        if field not in self.STRATIFY_FIELDS:
+            raise ValueError(f"Невідоме поле для стратифікації: {field}")
+        if field not in self._strata:
+            strata: dict = {}
+            for q in self._questions:
+                strata.setdefault(getattr(q, field), []).append(q)
+            self._strata[field] = strata
+        return self._strata[field]
 
     def to_dict(self):
         data = super().to_dict()
         data.update({
             "title": self.title,
             "time_per_question": self.time_per_question,
-            "questions": [q.to_dict() for q in self.questions]
+            "questions_per_attempt": self.questions_per_attempt,
+            "stratify_by": self.stratify_by,
+            "questions": [q.to_dict() for q in self._questions]
         })
         return data
 
     @classmethod
     def from_dict(cls, data):
-        test = cls(data['title'], data['time_per_question'], data['id'])
+        test = cls(data['title'], data['time_per_question'], data['id'],
+                   data.get('questions_per_attempt'))
+        if data.get('stratify_by') in cls.STRATIFY_FIELDS:
+            test.stratify_by = data['stratify_by']
         test.questions = [Question.from_dict(q_data) for q_data in data['questions']]
         return test
 
 class TestResult:
 
-    def __init__(self, test_title: str, test_id: str, score_percent: float, student_name: str = "Анонім"):
+    def __init__(self, test_title: str, test_id: str, score_percent: float, student_name: str = "Анонім",
+                 completed_at: float = None):
         self.test_title = test_title
         self.test_id = test_id
         self.score_percent = score_percent
         self.student_name = student_name
+        self.completed_at = completed_at
 
     def to_dict(self):
         return {
             "test_title": self.test_title,
             "test_id": self.test_id,
             "score_percent": self.score_percent,
-            "student_name": self.student_name
+            "student_name": self.student_name,
+            "completed_at": self.completed_at
         }
 
     @classmethod
     def from_dict(cls, data):
-        return cls(data['test_title'], data['test_id'], data['score_percent'], data.get('student_name', 'Анонім'))
\ No newline at end of file
+        return cls(data['test_title'], data['test_id'], data['score_percent'], data.get('student_name', 'Анонім'),
+                   data.get('completed_at'))
\ No newline at end of file
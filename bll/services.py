@@ -1,7 +1,9 @@
 ﻿import random
+import time
+import uuid
 from bll.models import Test, Question, Answer, TestResult
 
-from dal.repository import BaseRepository 
+from dal.repository import BaseRepository, StatisticsFilter
 from bll.exceptions import * 
 
 class TestManagementService:
@@ -9,13 +11,22 @@ class TestManagementService:
     def __init__(self, repository: BaseRepository):
         self._repository = repository
         self._tests = self._repository.load_all_tests()
+        self._tests_by_id = {test.id: test for test in self._tests}
+        self.catalog_id = str(uuid.uuid4())
+        self.catalog_version = 0
+        self._dirty_test_ids: set[str] = set()
 
     def _get_test_by_id(self, test_id: str) -> Test:
-        for test in self._tests:
-            if test.id == test_id:
-                return test
+        test = self._tests_by_id.get(test_id)
+        if test is not None:
+            return test
         raise TestNotFoundError(f"Тест з ID {test_id} не знайдено.")
 
+    def _get_test_for_update(self, test_id: str) -> Test:
+        test = self._get_test_by_id(test_id)
+        self._dirty_test_ids.add(test_id)
+        return test
+
     def _get_question_by_id(self, test: Test, question_id: str) -> Question:
         for q in test.questions:
             if q.id == question_id:
@@ -25,55 +36,61 @@ class TestManagementService:
     def save_changes(self):
         
         for test in self._tests:
-            for q in test.questions:
-
-                if q.answers and not any(ans.is_correct for ans in q.answers):
-                    raise QuestionValidationError(
-                        f"Помилка збереження: Питання '{q.text[:50]}...' у тесті '{test.title}' не має жодної правильної відповіді."
-                    )
+            q = test.find_invalid_question(allow_unanswered=True)
+            if q is not None:
+                raise QuestionValidationError(
+                    f"Помилка збереження: Питання '{q.text[:50]}...' у тесті '{test.title}' не має жодної правильної відповіді."
+                )
 
-        self._repository.save_all_tests(self._tests)
+        self._repository.save_all_tests(self._tests, dirty_ids=set(self._dirty_test_ids))
+        self._dirty_test_ids.clear()
     
-    def add_question(self, test_id: str, question_text: str) -> Question:
-        test = self._get_test_by_id(test_id)
-        new_question = Question(text=question_text)
+    def add_question(self, test_id: str, question_text: str, tag: str = None, difficulty: int = None) -> Question:
+        test = self._get_test_for_update(test_id)
+        new_question = Question(text=question_text, tag=tag, difficulty=difficulty)
         test.add_question(new_question)
         return new_question
 
     def remove_question(self, test_id: str, question_id: str):
-        test = self._get_test_by_id(test_id)
+        test = self._get_test_for_update(test_id)
         question = self._get_question_by_id(test, question_id)
-        test.questions.remove(question)
+        test.remove_question(question)
 
     def edit_question(self, test_id: str, question_id: str, new_text: str):
-        test = self._get_test_by_id(test_id)
+        test = self._get_test_for_update(test_id)
         question = self._get_question_by_id(test, question_id)
         question.text = new_text
 
+    def edit_question_classification(self, test_id: str, question_id: str, tag: str = None, difficulty: int = None):
+        test = self._get_test_for_update(test_id)
+        question = self._get_question_by_id(test, question_id)
+        question.set_classification(tag or None, difficulty or None)
+
     def get_all_questions(self, test_id: str) -> list[Question]:
         test = self._get_test_by_id(test_id)
         return test.questions
 
     def add_answer(self, test_id: str, question_id: str, text: str, is_correct: bool) -> Answer:
-        test = self._get_test_by_id(test_id)
+        test = self._get_test_for_update(test_id)
         question = self._get_question_by_id(test, question_id)
         new_answer = Answer(text=text, is_correct=is_correct)
         question.add_answer(new_answer)
         return new_answer
 
     def remove_answer(self, test_id: str, question_id: str, answer_id: str):
-        test = self._get_test_by_id(test_id)
+        test = self._get_test_for_update(test_id)
         question = self._get_question_by_id(test, question_id)
         for ans in question.answers:
             if ans.id == answer_id:
-                question.answers.remove(ans)
+                question.remove_answer(ans)
                 return
         raise AnswerNotFoundError(f"Відповідь з ID {answer_id} не знайдено.")
     
     def edit_answer(self, test_id: str, q_id: str, ans_id: str, new_text: str, new_is_correct: bool):
+        question = self._get_question_by_id(self._get_test_for_update(test_id), q_id)
         answer = self._get_answer_by_id(test_id, q_id, ans_id)
         answer.text = new_text
-        answer.is_correct = new_is_correct
+        question.set_answer_correct(answer, new_is_correct)
 
     def get_answers_for_question(self, test_id: str, question_id: str) -> list[Answer]:
         test = self._get_test_by_id(test_id)
@@ -87,15 +104,24 @@ class TestManagementService:
                 return ans
         raise AnswerNotFoundError(f"Відповідь з ID {ans_id} не знайдено.")
 
-    def create_test(self, title: str, time_per_question: int = 60) -> Test:
-        new_test = Test(title=title, time_per_question=time_per_question)
+    def create_test(self, title: str, time_per_question: int = 60,
+                    questions_per_attempt: int = None, stratify_by: str = None) -> Test:
+        new_test = Test(title=title, time_per_question=time_per_question,
+                        questions_per_attempt=questions_per_attempt, stratify_by=stratify_by)
         self._tests.append(new_test)
+        self._tests_by_id[new_test.id] = new_test
+        self._dirty_test_ids.add(new_test.id)
+        self.catalog_version += 1
         return new_test
     
-    def edit_test_settings(self, test_id: str, new_title: str, new_time: int):
-        test = self._get_test_by_id(test_id)
+    def edit_test_settings(self, test_id: str, new_title: str, new_time: int,
+                           questions_per_attempt: int = None, stratify_by: str = None):
+        test = self._get_test_for_update(test_id)
         test.title = new_title
         test.time_per_question = new_time
+        test.questions_per_attempt = questions_per_attempt
+        test.stratify_by = stratify_by
+        self.catalog_version += 1
 
     def get_all_tests(self) -> list[Test]:
         return self._tests
@@ -105,30 +131,39 @@ class TestManagementService:
 
 
 class TestingService:
-    def __init__(self, test: Test):
+    def __init__(self, test: Test, question_count: int = None):
         if not test.questions:
             raise InvalidTestError("Неможливо почати тест, у ньому немає питань.")
         
-        for q in test.questions:
-            if not q.answers or not any(ans.is_correct for ans in q.answers):
-                raise InvalidTestError(
-                    f"Неможливо почати тест. Питання '{q.text[:50]}...' не налаштоване (немає правильної відповіді)."
-                )
+        q = test.find_invalid_question()
+        if q is not None:
+            raise InvalidTestError(
+                f"Неможливо почати тест. Питання '{q.text[:50]}...' не налаштоване (немає правильної відповіді)."
+            )
         
         self.test = test
         self.current_question_index = -1
         self.user_answers: dict[str, str] = {}
-        self._shuffled_questions = random.sample(self.test.questions, len(self.test.questions))
+        self._shuffled_questions = self.test.draw_questions(question_count)
+        self._answer_order: dict[str, list[Answer]] = {}
 
     def get_next_question(self) -> Question | None:
         self.current_question_index += 1
         if self.current_question_index < len(self._shuffled_questions):
             question = self._shuffled_questions[self.current_question_index]
             
-            random.shuffle(question.answers)
+            answers = list(question.answers)
+            random.shuffle(answers)
+            self._answer_order[question.id] = answers
             return question
         return None
 
+    def get_answers(self, question: Question) -> list[Answer]:
+        return self._answer_order.get(question.id) or list(question.answers)
+
+    def get_question_count(self) -> int:
+        return len(self._shuffled_questions)
+
     def submit_answer(self, question_id: str, answer_id: str):
         self.user_answers[question_id] = answer_id
 
@@ -156,36 +191,65 @@ class TestingService:
 class StatisticsService:
     def __init__(self, repository: BaseRepository):
         self._repository = repository
+        self._totals_cache: tuple | None = None
+        self._titles_cache: tuple | None = None
 
     def record_result(self, test_id: str, test_title: str, score: float, student: str):
         result = TestResult(
             test_title=test_title,
             test_id=test_id,
             score_percent=score,
-            student_name=student
+            student_name=student,
+            completed_at=time.time()
         )
         self._repository.save_statistic(result)
 
-    def get_test_statistics(self) -> list[dict]:
-        all_results = self._repository.load_statistics()
-        all_tests = self._repository.load_all_tests()
+    def _aggregate(self, filter: StatisticsFilter = None) -> dict[str, tuple]:
+        totals: dict[str, list] = {}
+        for result in self._repository.iter_statistics(filter):
+            entry = totals.setdefault(result.test_id, [0, 0.0])
+            entry[0] += 1
+            entry[1] += result.score_percent
+        return {test_id: tuple(entry) for test_id, entry in totals.items()}
+
+    def _cached(self, kind: str, cache: tuple | None, compute) -> tuple:
+        fingerprint = self._repository.source_fingerprint(kind)
+        if fingerprint is not None and cache is not None and cache[0] == fingerprint:
+            return cache
+        value = compute()
+        if fingerprint is not None and self._repository.source_fingerprint(kind) != fingerprint:
+            fingerprint = None
+        return fingerprint, value
+
+    def _get_totals(self, filter: StatisticsFilter = None) -> dict[str, tuple]:
+        if filter is not None:
+            return self._aggregate(filter)
+        self._totals_cache = self._cached("stats", self._totals_cache, self._aggregate)
+        return self._totals_cache[1]
+
+    def _get_titles(self) -> list[tuple[str, str]]:
+        load_titles = lambda: [(test.id, test.title) for test in self._repository.load_all_tests()]
+        self._titles_cache = self._cached("tests", self._titles_cache, load_titles)
+        return self._titles_cache[1]
+
+    def get_test_statistics(self, filter: StatisticsFilter = None) -> list[dict]:
+        totals = self._get_totals(filter)
         
         stats = []
-        for test in all_tests:
-            results_for_test = [r for r in all_results if r.test_id == test.id]
-            if not results_for_test:
+        for test_id, title in self._get_titles():
+            attempts, score_sum = totals.get(test_id, (0, 0.0))
+            if not attempts:
                 stats.append({
-                    "title": test.title,
+                    "title": title,
                     "attempts": 0,
                     "average_score": 0
                 })
                 continue
                 
-            attempts = len(results_for_test)
-            average_score = sum(r.score_percent for r in results_for_test) / attempts
+            average_score = score_sum / attempts
             
             stats.append({
-                "title": test.title,
+                "title": title,
                 "attempts": attempts,
                 "average_score": round(average_score, 2)
             })
@@ -0,0 +1,182 @@
+﻿import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+MAGIC_BYTES = {
+    b"\x1f\x8b": "gzip",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+
+class CodecMismatchError(ValueError):
+    pass
+
+
+def detect_format(file_path: str) -> str | None:
+    with open(file_path, 'rb') as f:
+        head = f.read(4)
+    if not head:
+        return None
+    for magic, name in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return name
+    return "json"
+
+
+class StorageCodec(ABC):
+    extension = ".json"
+    format_name = "json"
+    read_errors: tuple = (IOError, EOFError, json.JSONDecodeError)
+
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+
+    @abstractmethod
+    def open(self, file_path: str, mode: str):
+        pass
+
+    def _encode_item(self, item: dict) -> str:
+        if self.compact:
+            return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+        return "\n".join("    " + line for line in json.dumps(item, indent=4, ensure_ascii=False).splitlines())
+
+    def write_items(self, file_path: str, items: Iterable[dict]):
+        separator = "," if self.compact else ",\n"
+        tmp_path = file_path + ".tmp"
+        try:
+            with self.open(tmp_path, 'w') as f:
+                f.write("[")
+                first = True
+                for item in items:
+                    if first:
+                        f.write("" if self.compact else "\n")
+                        first = False
+                    else:
+                        f.write(separator)
+                    f.write(self._encode_item(item))
+                f.write("]" if first or self.compact else "\n]")
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, file_path)
+
+    def check_format(self, file_path: str):
+        detected = detect_format(file_path)
+        if detected is not None and detected != self.format_name:
+            raise CodecMismatchError(
+                f"Файл {file_path} збережено у форматі {detected}, а очікувався {self.format_name}."
+            )
+
+    def iter_items(self, file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+        self.check_format(file_path)
+        decoder = json.JSONDecoder()
+        with self.open(file_path, 'r') as f:
+            buffer, pos, eof = "", 0, False
+            state = "start"
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos == len(buffer):
+                    if eof:
+                        raise json.JSONDecodeError("Неочікуваний кінець файлу", buffer, pos)
+                    buffer, pos = f.read(chunk_size), 0
+                    eof = not buffer
+                    continue
+
+                char = buffer[pos]
+                if state == "start":
+                    if char != "[":
+                        raise json.JSONDecodeError("Очікувався JSON-масив", buffer, pos)
+                    pos += 1
+                    state = "first"
+                elif state == "separator":
+                    if char == "]":
+                        return
+                    if char != ",":
+                        raise json.JSONDecodeError("Очікувалась ',' або ']'", buffer, pos)
+                    pos += 1
+                    state = "item"
+                elif state == "first" and char == "]":
+                    return
+                else:
+                    try:
+                        item, end = decoder.raw_decode(buffer, pos)
+                        complete = eof or end < len(buffer)
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                        complete = False
+                    if not complete:
+                        chunk = f.read(max(chunk_size, len(buffer) - pos))
+                        eof = not chunk
+                        buffer, pos = buffer[pos:] + chunk, 0
+                        continue
+                    yield item
+                    pos = end
+                    state = "separator"
+
+    def read_items(self, file_path: str) -> list[dict]:
+        return list(self.iter_items(file_path))
+
+
+class JsonCodec(StorageCodec):
+    def open(self, file_path: str, mode: str):
+        return open(file_path, mode, encoding='utf-8')
+
+
+class GzipCodec(StorageCodec):
+    extension = ".json.gz"
+    format_name = "gzip"
+
+    def __init__(self, compact: bool = True, level: int = 6):
+        super().__init__(compact)
+        self.level = level
+
+    def open(self, file_path: str, mode: str):
+        import gzip
+        return gzip.open(file_path, mode + 't', encoding='utf-8', compresslevel=self.level)
+
+
+class ZstdCodec(StorageCodec):
+    extension = ".json.zst"
+    format_name = "zstd"
+
+    def __init__(self, compact: bool = True, level: int = 3):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Для кодека zstd потрібно встановити пакет 'zstandard'.")
+        super().__init__(compact)
+        self.level = level
+        self._zstd = zstandard
+        self.read_errors = StorageCodec.read_errors + (zstandard.ZstdError,)
+
+    def open(self, file_path: str, mode: str):
+        if mode == 'w':
+            return self._zstd.open(file_path, 'wt', encoding='utf-8',
+                                   cctx=self._zstd.ZstdCompressor(level=self.level))
+        return self._zstd.open(file_path, 'rt', encoding='utf-8')
+
+
+CODECS = {
+    "json": lambda: JsonCodec(),
+    "json-compact": lambda: JsonCodec(compact=True),
+    "gzip": lambda: GzipCodec(),
+    "zstd": lambda: ZstdCodec(),
+}
+
+
+def get_codec(name: str) -> StorageCodec:
+    if name not in CODECS:
+        raise ValueError(f"Невідомий кодек: {name}. Доступні: {', '.join(CODECS)}")
+    return CODECS[name]()
+
+
+def migrate_file(src_path: str, src_codec: StorageCodec, dst_path: str, dst_codec: StorageCodec):
+    dst_codec.write_items(dst_path, src_codec.iter_items(src_path))
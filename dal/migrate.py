@@ -0,0 +1,104 @@
+﻿import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import tempfile
+import time
+
+from bll.models import Test, TestResult
+from dal.codecs import CODECS, get_codec, migrate_file
+from dal.repository import ShardedRepository
+
+
+def convert(args):
+    src_codec = get_codec(args.src_codec)
+    dst_codec = get_codec(args.dst_codec)
+    migrate_file(args.src, src_codec, args.dst, dst_codec)
+
+    src_size = os.path.getsize(args.src)
+    dst_size = os.path.getsize(args.dst)
+    print(f"{args.src} ({args.src_codec}, {src_size} Б) -> {args.dst} ({args.dst_codec}, {dst_size} Б)")
+
+
+def shard(args):
+    codec = get_codec(args.src_codec)
+    with ShardedRepository(args.dst, shard_count=args.shard_count) as repository:
+        if repository.load_all_tests() or any(os.path.exists(path) for path in repository.watched_paths("stats")):
+            print(f"Каталог {args.dst} вже містить дані; міграцію скасовано.")
+            sys.exit(1)
+
+        tests = [Test.from_dict(data) for data in codec.iter_items(args.tests)]
+        repository.save_all_tests(tests)
+        results = [TestResult.from_dict(data) for data in codec.iter_items(args.stats)] if os.path.exists(args.stats) else []
+        repository.save_statistics(results)
+
+    print(f"Перенесено тестів: {len(tests)}, результатів: {len(results)} -> {args.dst} ({repository.shard_count} шардів)")
+
+
+def benchmark(args):
+    src_codec = get_codec(args.src_codec)
+    items = src_codec.read_items(args.src)
+    print(f"Файл: {args.src}, записів: {len(items)}")
+    print(f"{'Кодек':<14}{'Розмір, Б':>14}{'Стиснення':>12}{'Запис, МБ/с':>14}{'Читання, МБ/с':>16}")
+
+    baseline_size = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in CODECS:
+            try:
+                codec = get_codec(name)
+            except ImportError as e:
+                print(f"{name:<14}пропущено: {e}")
+                continue
+            path = os.path.join(tmp_dir, "bench" + codec.extension)
+
+            started = time.perf_counter()
+            codec.write_items(path, items)
+            write_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for _ in codec.iter_items(path):
+                pass
+            read_time = time.perf_counter() - started
+
+            size = os.path.getsize(path)
+            baseline_size = baseline_size or size
+            megabytes = baseline_size / (1024 * 1024)
+            print(f"{name:<14}{size:>14}{baseline_size / size:>11.1f}x"
+                  f"{megabytes / write_time:>14.1f}{megabytes / read_time:>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Міграція та порівняння форматів зберігання даних.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = subparsers.add_parser("convert", help="Перекодувати файл в інший формат.")
+    convert_parser.add_argument("src")
+    convert_parser.add_argument("dst")
+    convert_parser.add_argument("--from", dest="src_codec", default="json", choices=list(CODECS))
+    convert_parser.add_argument("--to", dest="dst_codec", default="gzip", choices=list(CODECS))
+    convert_parser.set_defaults(func=convert)
+
+    shard_parser = subparsers.add_parser("shard", help="Перенести файли даних у шардоване сховище.")
+    shard_parser.add_argument("tests")
+    shard_parser.add_argument("stats")
+    shard_parser.add_argument("dst")
+    shard_parser.add_argument("--from", dest="src_codec", default="json", choices=list(CODECS))
+    shard_parser.add_argument("--shards", dest="shard_count", type=int, default=16)
+    shard_parser.set_defaults(func=shard)
+
+    bench_parser = subparsers.add_parser("benchmark", help="Порівняти розмір і швидкість кодеків.")
+    bench_parser.add_argument("src")
+    bench_parser.add_argument("--from", dest="src_codec", default="json", choices=list(CODECS))
+    bench_parser.set_defaults(func=benchmark)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
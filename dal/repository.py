@@ -1,7 +1,14 @@
 ﻿import json
 import os
+import threading
+import zlib
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import chain
+from collections.abc import Iterable, Iterator
 from bll.models import Test, TestResult
+from dal.codecs import StorageCodec, JsonCodec, CodecMismatchError
 
 class BaseRepository(ABC):
     
@@ -10,7 +17,7 @@ class BaseRepository(ABC):
         pass
 
     @abstractmethod
-    def save_all_tests(self, tests: list[Test]):
+    def save_all_tests(self, tests: list[Test], dirty_ids: set[str] = None):
         pass
 
     @abstractmethod
@@ -21,17 +28,89 @@ class BaseRepository(ABC):
     def save_statistic(self, result: TestResult):
         pass
 
+    def iter_statistics(self, filter: "StatisticsFilter" = None) -> Iterator[TestResult]:
+        for result in self.load_statistics():
+            if filter is None or filter.matches(result.to_dict()):
+                yield result
+
+    def watched_paths(self, kind: str) -> list[str]:
+        return []
+
+    def source_fingerprint(self, kind: str) -> tuple | None:
+        paths = self.watched_paths(kind)
+        if not paths:
+            return None
+        fingerprint = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                fingerprint.append((path, st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                fingerprint.append((path, None))
+        return tuple(fingerprint)
+
+    def close(self):
+        pass
+
 class DataAccessError(Exception):
     pass
 
+class StatisticsFilter:
+    def __init__(self, test_ids: Iterable[str] = None, since: float = None, until: float = None):
+        self.test_ids = set(test_ids) if test_ids is not None else None
+        self.since = since
+        self.until = until
+
+    def matches(self, data: dict) -> bool:
+        if self.test_ids is not None and data.get('test_id') not in self.test_ids:
+            return False
+        if self.since is not None or self.until is not None:
+            completed_at = data.get('completed_at')
+            if completed_at is None:
+                return False
+            if self.since is not None and completed_at < self.since:
+                return False
+            if self.until is not None and completed_at >= self.until:
+                return False
+        return True
+
+@contextmanager
+def _file_lock(file_path: str):
+    with open(file_path + ".lock", 'a+') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
 class FileRepository(BaseRepository):
-    def __init__(self, tests_file_path: str, stats_file_path: str):
+    def __init__(self, tests_file_path: str, stats_file_path: str, codec: StorageCodec = None):
         self.tests_file_path = tests_file_path
         self.stats_file_path = stats_file_path
+        self.codec = codec or JsonCodec()
         
         self._ensure_file_exists(self.tests_file_path, [])
         self._ensure_file_exists(self.stats_file_path, [])
 
+    def watched_paths(self, kind: str) -> list[str]:
+        return [self.tests_file_path] if kind == "tests" else [self.stats_file_path]
+
     def _ensure_file_exists(self, file_path, default_content):
         directory = os.path.dirname(file_path)
         if not os.path.exists(directory):
@@ -42,51 +121,348 @@ class FileRepository(BaseRepository):
 
         if not os.path.exists(file_path):
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(default_content, f)
+                self.codec.write_items(file_path, default_content)
             except IOError as e:
                 print(f"Помилка при створенні файлу {file_path}: {e}")
 
     def load_all_tests(self) -> list[Test]:
         try:
-            with open(self.tests_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [Test.from_dict(test_data) for test_data in data]
-        except (IOError, json.JSONDecodeError, FileNotFoundError):
+            return [Test.from_dict(test_data) for test_data in self.codec.iter_items(self.tests_file_path)]
+        except CodecMismatchError as e:
+            raise DataAccessError(str(e))
+        except self.codec.read_errors:
             return []
 
-    def save_all_tests(self, tests: list[Test]):
+    def save_all_tests(self, tests: list[Test], dirty_ids: set[str] = None):
         directory = os.path.dirname(self.tests_file_path)
         if not os.path.exists(directory):
             os.makedirs(directory)
         try:
-            with open(self.tests_file_path, 'w', encoding='utf-8') as f:
-                data_to_save = [test.to_dict() for test in tests]
-                json.dump(data_to_save, f, indent=4, ensure_ascii=False)
+            with _file_lock(self.tests_file_path):
+                if os.path.exists(self.tests_file_path):
+                    self.codec.check_format(self.tests_file_path)
+                self.codec.write_items(self.tests_file_path, (test.to_dict() for test in tests))
+        except CodecMismatchError as e:
+            raise DataAccessError(str(e))
         except IOError as e:
             print(f"Помилка збереження тестів: {e}")
             raise DataAccessError(f"Не вдалося зберегти дані у файл {self.tests_file_path}")
 
     def load_statistics(self) -> list[TestResult]:
         try:
-            with open(self.stats_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return [TestResult.from_dict(stat_data) for stat_data in data]
-        except (IOError, json.JSONDecodeError, FileNotFoundError):
+            return [TestResult.from_dict(stat_data) for stat_data in self.codec.iter_items(self.stats_file_path)]
+        except CodecMismatchError as e:
+            raise DataAccessError(str(e))
+        except self.codec.read_errors:
             return []
 
+    def _iter_saved_statistics(self):
+        try:
+            yield from self.codec.iter_items(self.stats_file_path)
+        except CodecMismatchError as e:
+            raise DataAccessError(str(e))
+        except self.codec.read_errors:
+            return
+
+    def _iter_statistics_for_update(self):
+        if not os.path.exists(self.stats_file_path) or os.path.getsize(self.stats_file_path) == 0:
+            return
+        try:
+            yield from self.codec.iter_items(self.stats_file_path)
+        except (CodecMismatchError,) + self.codec.read_errors as e:
+            print(f"Помилка читання статистики: {e}")
+            raise DataAccessError(
+                f"Не вдалося прочитати файл {self.stats_file_path}; його не перезаписано, щоб не втратити історію."
+            )
+
+    def iter_statistics(self, filter: StatisticsFilter = None) -> Iterator[TestResult]:
+        for stat_data in self._iter_saved_statistics():
+            if filter is None or filter.matches(stat_data):
+                yield TestResult.from_dict(stat_data)
+
     def save_statistic(self, result: TestResult):
-        stats = self.load_statistics()
-        stats.append(result)
-        
         directory = os.path.dirname(self.stats_file_path)
         if not os.path.exists(directory):
             os.makedirs(directory)
             
         try:
-            with open(self.stats_file_path, 'w', encoding='utf-8') as f:
-                data_to_save = [stat.to_dict() for stat in stats]
-                json.dump(data_to_save, f, indent=4, ensure_ascii=False)
+            with _file_lock(self.stats_file_path):
+                self.codec.write_items(self.stats_file_path, chain(self._iter_statistics_for_update(), [result.to_dict()]))
         except IOError as e:
             print(f"Помилка збереження статистики: {e}")
-            raise DataAccessError(f"Не вдалося зберегти дані у файл {self.stats_file_path}")
\ No newline at end of file
+            raise DataAccessError(f"Не вдалося зберегти дані у файл {self.stats_file_path}")
+
+def _read_json_shard(file_path: str, strict: bool = False) -> list[dict]:
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+    except (IOError, ValueError) as e:
+        if strict:
+            print(f"Помилка читання шарду {file_path}: {e}")
+            raise DataAccessError(f"Не вдалося прочитати шард {file_path}; його не перезаписано.")
+        return []
+
+class ShardedRepository(BaseRepository):
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, root_dir: str, shard_count: int = 16, max_workers: int = None, use_processes: bool = False):
+        self.root_dir = root_dir
+        self.tests_dir = os.path.join(root_dir, "tests")
+        self.stats_dir = os.path.join(root_dir, "stats")
+        self.manifest_path = os.path.join(root_dir, self.MANIFEST_NAME)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        for directory in (self.tests_dir, self.stats_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        manifest = self._read_manifest()
+        if manifest is None:
+            manifest = {"shard_count": shard_count, "tests": []}
+            self._write_json(self.manifest_path, manifest)
+        self.shard_count = manifest["shard_count"]
+        self._test_order: list[str] = manifest["tests"]
+        self._saved_shards: dict[str, int] = {}
+
+    def _read_manifest(self) -> dict | None:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, json.JSONDecodeError, FileNotFoundError):
+            return None
+
+    def watched_paths(self, kind: str) -> list[str]:
+        if kind == "tests":
+            return [self.manifest_path] + [self._tests_shard_path(i) for i in range(self.shard_count)]
+        return [self._stats_shard_path(i) for i in range(self.shard_count)]
+
+    def shard_for(self, test_id: str) -> int:
+        return zlib.crc32(test_id.encode('utf-8')) % self.shard_count
+
+    def _tests_shard_path(self, shard: int) -> str:
+        return os.path.join(self.tests_dir, f"shard_{shard:04d}.json")
+
+    def _stats_shard_path(self, shard: int) -> str:
+        return os.path.join(self.stats_dir, f"shard_{shard:04d}.json")
+
+    def _read_shard(self, file_path: str) -> list[dict]:
+        return _read_json_shard(file_path)
+
+    def _write_json(self, file_path: str, data):
+        tmp_path = file_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, file_path)
+        except IOError as e:
+            print(f"Помилка збереження шарду {file_path}: {e}")
+            raise DataAccessError(f"Не вдалося зберегти дані у файл {file_path}")
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                if self.use_processes:
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _load_shards(self, paths: list[str]) -> list[list[dict]]:
+        existing = [path for path in paths if os.path.exists(path)]
+        if self.max_workers == 1 or len(existing) < 2:
+            return [_read_json_shard(path) for path in existing]
+        return list(self._get_executor().map(_read_json_shard, existing))
+
+    def load_all_tests(self) -> list[Test]:
+        shards = self._load_shards([self._tests_shard_path(i) for i in range(self.shard_count)])
+
+        by_id = {}
+        for data in shards:
+            for test_data in data:
+                by_id[test_data['id']] = Test.from_dict(test_data)
+        self._saved_shards = {test_id: self.shard_for(test_id) for test_id in by_id}
+
+        manifest = self._read_manifest()
+        if manifest is not None:
+            self._test_order = manifest["tests"]
+        ordered = [by_id.pop(test_id) for test_id in self._test_order if test_id in by_id]
+        return ordered + list(by_id.values())
+
+    def save_all_tests(self, tests: list[Test], dirty_ids: set[str] = None):
+        current = {test.id: self._saved_shards.get(test.id) for test in tests}
+        for test_id, shard in current.items():
+            if shard is None:
+                current[test_id] = self.shard_for(test_id)
+
+        if dirty_ids is None:
+            dirty_shards = set(range(self.shard_count))
+        else:
+            dirty_shards = {current[test_id] for test_id in dirty_ids if test_id in current}
+            dirty_shards |= {current[test_id] for test_id in current.keys() - self._saved_shards.keys()}
+            dirty_shards |= {self._saved_shards[test_id] for test_id in self._saved_shards.keys() - current.keys()}
+
+        if dirty_shards:
+            grouped: dict[int, list[dict]] = {shard: [] for shard in dirty_shards}
+            for test in tests:
+                if current[test.id] in grouped:
+                    grouped[current[test.id]].append(test.to_dict())
+            for shard, data in grouped.items():
+                if not data and not os.path.exists(self._tests_shard_path(shard)):
+                    continue
+                with _file_lock(self._tests_shard_path(shard)):
+                    self._write_json(self._tests_shard_path(shard), data)
+        self._saved_shards = current
+
+        test_order = [test.id for test in tests]
+        if test_order != self._test_order:
+            with _file_lock(self.manifest_path):
+                self._write_json(self.manifest_path, {"shard_count": self.shard_count, "tests": test_order})
+            self._test_order = test_order
+
+    def load_statistics(self) -> list[TestResult]:
+        shards = self._load_shards([self._stats_shard_path(i) for i in range(self.shard_count)])
+        return [TestResult.from_dict(stat_data) for data in shards for stat_data in data]
+
+    def iter_statistics(self, filter: StatisticsFilter = None) -> Iterator[TestResult]:
+        if filter is not None and filter.test_ids is not None:
+            shards = sorted({self.shard_for(test_id) for test_id in filter.test_ids})
+        else:
+            shards = range(self.shard_count)
+        for shard in shards:
+            for stat_data in self._read_shard(self._stats_shard_path(shard)):
+                if filter is None or filter.matches(stat_data):
+                    yield TestResult.from_dict(stat_data)
+
+    def save_statistic(self, result: TestResult):
+        self.save_statistics([result])
+
+    def save_statistics(self, results: Iterable[TestResult]):
+        grouped: dict[int, list[dict]] = {}
+        for result in results:
+            grouped.setdefault(self.shard_for(result.test_id), []).append(result.to_dict())
+        for shard, new_data in grouped.items():
+            file_path = self._stats_shard_path(shard)
+            with _file_lock(file_path):
+                data = _read_json_shard(file_path, strict=True)
+                data.extend(new_data)
+                self._write_json(file_path, data)
+
+
+class CachingRepository(BaseRepository):
+    MODELS = {"tests": Test, "stats": TestResult}
+
+    def __init__(self, repository: BaseRepository, max_items: int = 100_000):
+        self._repository = repository
+        self.max_items = max_items
+        self._cache: OrderedDict[str, tuple[tuple, list[dict]]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, kind: str, fingerprint: tuple | None) -> list[dict] | None:
+        with self._lock:
+            entry = self._cache.get(kind)
+            if fingerprint is not None and entry is not None and entry[0] == fingerprint:
+                self._cache.move_to_end(kind)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _get(self, kind: str, loader) -> list:
+        fingerprint = self.source_fingerprint(kind)
+        cached = self._lookup(kind, fingerprint)
+        if cached is not None:
+            return [self.MODELS[kind].from_dict(data) for data in cached]
+
+        items = loader()
+        if fingerprint is not None and len(items) <= self.max_items:
+            self._put(kind, fingerprint, [item.to_dict() for item in items])
+        return items
+
+    def _put(self, kind: str, fingerprint: tuple, items: list[dict]):
+        if self.source_fingerprint(kind) != fingerprint:
+            return
+        with self._lock:
+            self._invalidate(kind)
+            self._cache[kind] = (fingerprint, items)
+            self._size += len(items)
+            while self._size > self.max_items:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _invalidate(self, kind: str):
+        entry = self._cache.pop(kind, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def load_all_tests(self) -> list[Test]:
+        return self._get("tests", self._repository.load_all_tests)
+
+    def save_all_tests(self, tests: list[Test], dirty_ids: set[str] = None):
+        try:
+            self._repository.save_all_tests(tests, dirty_ids)
+        finally:
+            with self._lock:
+                self._invalidate("tests")
+
+    def load_statistics(self) -> list[TestResult]:
+        return self._get("stats", self._repository.load_statistics)
+
+    def iter_statistics(self, filter: StatisticsFilter = None) -> Iterator[TestResult]:
+        fingerprint = self.source_fingerprint("stats")
+        cached = self._lookup("stats", fingerprint)
+        if cached is not None:
+            for data in cached:
+                if filter is None or filter.matches(data):
+                    yield TestResult.from_dict(data)
+            return
+
+        yield from self._repository.iter_statistics(filter)
+
+    def save_statistic(self, result: TestResult):
+        try:
+            self._repository.save_statistic(result)
+        finally:
+            with self._lock:
+                self._invalidate("stats")
+
+    def watched_paths(self, kind: str) -> list[str]:
+        return self._repository.watched_paths(kind)
+
+    def close(self):
+        self._repository.close()
+
+    def cache_info(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._cache),
+                "size": self._size,
+                "max_items": self.max_items
+            }
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
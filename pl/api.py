@@ -0,0 +1,338 @@
+﻿import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from dal.repository import BaseRepository, FileRepository, ShardedRepository, CachingRepository, DataAccessError
+from bll.services import TestManagementService, TestingService, StatisticsService
+from bll.exceptions import *
+
+TESTS_FILE = os.path.join(PROJECT_ROOT, "data", "data_tests.json")
+STATS_FILE = os.path.join(PROJECT_ROOT, "data", "data_stats.json")
+
+MAX_BODY_SIZE = 1024 * 1024
+MAX_HEADERS = 100
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class TestingSession:
+    def __init__(self, testing_service: TestingService, student_name: str):
+        self.testing_service = testing_service
+        self.student_name = student_name
+        self.current_question = None
+        self.last_access = time.monotonic()
+
+
+class GradingApi:
+    def __init__(self, repository: BaseRepository, executor: ThreadPoolExecutor = None,
+                 session_ttl: int = 3600):
+        self._repository = repository
+        self._stats_service = StatisticsService(repository)
+        self._executor = executor or ThreadPoolExecutor()
+        self._sessions: dict[str, TestingSession] = {}
+        self._session_ttl = session_ttl
+        self._catalog: TestManagementService | None = None
+        self._catalog_fingerprint = None
+        self._catalog_lock = asyncio.Lock()
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _refresh_catalog(self) -> TestManagementService:
+        fingerprint = self._repository.source_fingerprint("tests")
+        if self._catalog is None or fingerprint is None or fingerprint != self._catalog_fingerprint:
+            self._catalog = TestManagementService(self._repository)
+            self._catalog_fingerprint = fingerprint
+        return self._catalog
+
+    async def _load_catalog(self) -> TestManagementService:
+        async with self._catalog_lock:
+            return await self._run_blocking(self._refresh_catalog)
+
+    def _get_session(self, session_id: str) -> TestingSession:
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Сесію {session_id} не знайдено.")
+        session.last_access = time.monotonic()
+        return session
+
+    def _purge_expired_sessions(self):
+        deadline = time.monotonic() - self._session_ttl
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_access < deadline]:
+            del self._sessions[session_id]
+
+    @staticmethod
+    def _question_to_dict(question, answers) -> dict:
+        return {
+            "id": question.id,
+            "text": question.text,
+            "answers": [{"id": ans.id, "text": ans.text} for ans in answers]
+        }
+
+    async def list_tests(self, body: dict) -> dict:
+        catalog = await self._load_catalog()
+        return {"tests": [
+            {"id": t.id, "title": t.title, "time_per_question": t.time_per_question}
+            for t in catalog.get_all_tests()
+        ]}
+
+    async def start_session(self, body: dict) -> dict:
+        test_id = body.get("test_id")
+        if not test_id:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Поле 'test_id' є обов'язковим.")
+
+        question_count = body.get("question_count")
+        if question_count is not None and (type(question_count) is not int or question_count < 1):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Поле 'question_count' має бути додатним цілим числом.")
+
+        catalog = await self._load_catalog()
+        test = catalog.find_test_by_id(test_id)
+        testing_service = TestingService(test, question_count)
+
+        self._purge_expired_sessions()
+        session_id = str(uuid.uuid4())
+        self._sessions[session_id] = TestingSession(testing_service, body.get("student_name") or "Анонім")
+        return {
+            "session_id": session_id,
+            "test_title": test.title,
+            "time_per_question": test.time_per_question,
+            "total": testing_service.get_question_count()
+        }
+
+    async def next_question(self, session_id: str, body: dict) -> dict:
+        session = self._get_session(session_id)
+        session.current_question = session.testing_service.get_next_question()
+        if session.current_question is None:
+            return {"question": None}
+        answers = session.testing_service.get_answers(session.current_question)
+        return {"question": self._question_to_dict(session.current_question, answers)}
+
+    async def submit_answer(self, session_id: str, body: dict) -> dict:
+        session = self._get_session(session_id)
+        question = session.current_question
+        if question is None or body.get("question_id") != question.id:
+            raise ApiError(HTTPStatus.CONFLICT, "Відповідь можна надіслати лише на поточне питання.")
+
+        answer_id = body.get("answer_id")
+        if not any(ans.id == answer_id for ans in question.answers):
+            raise AnswerNotFoundError(f"Відповідь з ID {answer_id} не знайдено.")
+
+        session.testing_service.submit_answer(question.id, answer_id)
+        return {"accepted": True}
+
+    async def finish_session(self, session_id: str, body: dict) -> dict:
+        session = self._get_session(session_id)
+        testing_service = session.testing_service
+        results = testing_service.stop_test()
+
+        del self._sessions[session_id]
+        try:
+            await self._run_blocking(
+                self._stats_service.record_result,
+                testing_service.test.id,
+                testing_service.test.title,
+                results['percent'],
+                session.student_name
+            )
+        except DataAccessError:
+            self._sessions[session_id] = session
+            raise
+        return results
+
+    async def statistics(self, body: dict) -> dict:
+        return {"statistics": await self._run_blocking(self._stats_service.get_test_statistics)}
+
+    async def dispatch(self, method: str, path: str, body: dict) -> dict:
+        parts = [p for p in path.split('?', 1)[0].split('/') if p]
+
+        if method == "GET" and parts == ["tests"]:
+            return await self.list_tests(body)
+        if method == "GET" and parts == ["stats"]:
+            return await self.statistics(body)
+        if method == "POST" and parts == ["sessions"]:
+            return await self.start_session(body)
+        if method == "POST" and len(parts) == 3 and parts[0] == "sessions":
+            handlers = {
+                "next": self.next_question,
+                "answer": self.submit_answer,
+                "finish": self.finish_session,
+            }
+            if parts[2] in handlers:
+                return await handlers[parts[2]](parts[1], body)
+        raise ApiError(HTTPStatus.NOT_FOUND, f"Маршрут {method} {path} не знайдено.")
+
+    async def handle(self, method: str, path: str, body: dict) -> tuple[HTTPStatus, dict]:
+        try:
+            return HTTPStatus.OK, await self.dispatch(method, path, body)
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except (TestNotFoundError, QuestionNotFoundError, AnswerNotFoundError) as e:
+            return HTTPStatus.NOT_FOUND, {"error": str(e)}
+        except TestLogicError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except DataAccessError as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            print(f"Неочікувана помилка обробки {method} {path}: {e!r}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Внутрішня помилка сервера."}
+
+    @staticmethod
+    def _parse_body(raw_body: bytes) -> dict | None:
+        if not raw_body:
+            return {}
+        try:
+            body = json.loads(raw_body)
+        except ValueError:
+            return None
+        return body if isinstance(body, dict) else None
+
+    @staticmethod
+    async def _send_response(writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict, keep_alive: bool):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> tuple[bytes, dict] | None:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise ValueError("Забагато заголовків.")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return request_line, headers
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await self._read_head(reader)
+                except ValueError:
+                    await self._send_response(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                              {"error": "Заголовки запиту завеликі."}, False)
+                    break
+                if head is None:
+                    break
+
+                request_line, headers = head
+                request_parts = request_line.decode('latin-1').split()
+                raw_length = headers.get("content-length") or "0"
+                length = int(raw_length) if raw_length.isascii() and raw_length.isdigit() else None
+                if len(request_parts) != 3:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": "Некоректний рядок запиту."}
+                    keep_alive = False
+                elif length is None:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": "Некоректний заголовок Content-Length."}
+                    keep_alive = False
+                elif length > MAX_BODY_SIZE:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Тіло запиту завелике."}
+                    keep_alive = False
+                else:
+                    method, path, version = request_parts
+                    raw_body = await reader.readexactly(length) if length else b""
+                    body = self._parse_body(raw_body)
+                    if body is None:
+                        status, payload = HTTPStatus.BAD_REQUEST, {"error": "Тіло запиту має бути JSON-об'єктом."}
+                    else:
+                        status, payload = await self.handle(method.upper(), path, body)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                await self._send_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int, repository: BaseRepository):
+    api = GradingApi(repository)
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"Сервіс тестування слухає http://{host}:{port} (PID {os.getpid()})")
+    async with server:
+        await server.serve_forever()
+
+
+def run_worker(host: str, port: int, tests_file: str, stats_file: str, data_dir: str = None):
+    if data_dir:
+        repository = CachingRepository(ShardedRepository(data_dir))
+    else:
+        repository = CachingRepository(FileRepository(tests_file, stats_file))
+    try:
+        asyncio.run(serve(host, port, repository))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        repository.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless JSON API для проходження тестів.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Кількість процесів; процес i слухає порт port + i.")
+    parser.add_argument("--tests-file", default=TESTS_FILE)
+    parser.add_argument("--stats-file", default=STATS_FILE)
+    parser.add_argument("--data-dir", default=None,
+                        help="Каталог шардованого сховища (див. dal/migrate.py shard); замінює --tests-file/--stats-file.")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        run_worker(args.host, args.port, args.tests_file, args.stats_file, args.data_dir)
+        return
+
+    workers = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(args.host, args.port + i, args.tests_file, args.stats_file, args.data_dir)
+        )
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,35 +7,57 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 import streamlit as st
-import time
 
-from dal.repository import FileRepository, DataAccessError
+from dal.repository import FileRepository, ShardedRepository, CachingRepository, DataAccessError
 from bll.services import TestManagementService, TestingService, StatisticsService
 from bll.exceptions import *
 
 TESTS_FILE = os.path.join(PROJECT_ROOT, "data", "data_tests.json")
 STATS_FILE = os.path.join(PROJECT_ROOT, "data", "data_stats.json")
+DATA_DIR = os.environ.get("COURSEWORK_DATA_DIR")
 
 @st.cache_resource
-def get_services():
-    """Ініціалізує та повертає всі необхідні сервіси."""
+def get_repository():
+    """Створює репозиторій; сам по собі ще не читає дані з диска."""
+    if DATA_DIR:
+        return CachingRepository(ShardedRepository(DATA_DIR))
+    return CachingRepository(FileRepository(TESTS_FILE, STATS_FILE))
+
+
+@st.cache_resource
+def get_management_service():
+    """Завантажує каталог тестів під час першого звернення сторінки, а не до відмальовки навігації."""
+    return TestManagementService(get_repository())
+
+
+@st.cache_resource
+def get_stats_service():
+    return StatisticsService(get_repository())
+
+
+def load_service(factory):
     try:
-        repository = FileRepository(TESTS_FILE, STATS_FILE)
-        management_service = TestManagementService(repository)
-        stats_service = StatisticsService(repository)
-        return management_service, stats_service, repository
+        return factory()
     except DataAccessError as e:
         st.error(f"Критична помилка доступу до даних: {e}")
-        return None, None, None
+        st.stop()
 
 
-management_service, stats_service, repository = get_services()
+@st.cache_resource(max_entries=4)
+def get_page_model(_service: TestManagementService, catalog_id: str, catalog_version: int) -> dict:
+    """Будує списки назв тестів для selectbox; перебудовується лише при зміні каталогу."""
+    titles = []
+    id_by_title = {}
+    for test in _service.get_all_tests():
+        if test.title not in id_by_title:
+            id_by_title[test.title] = test.id
+            titles.append(test.title)
+    return {"titles": titles, "id_by_title": id_by_title}
 
-if not management_service:
-    st.stop()
 
 def page_admin():
     st.title("Керування тестами (Режим Адміністратора)")
+    management_service = load_service(get_management_service)
 
     def safe_save_changes():
         try:
@@ -61,24 +83,30 @@ def page_admin():
 
     st.divider()
 
-    all_tests = management_service.get_all_tests()
-    if not all_tests:
+    page_model = get_page_model(management_service, management_service.catalog_id, management_service.catalog_version)
+    if not page_model["titles"]:
         st.info("Ще не створено жодного тесту. Почніть зі створення нового.")
         return
 
-    test_titles = [t.title for t in all_tests]
-    selected_title = st.selectbox("Оберіть тест для редагування:", test_titles)
+    selected_title = st.selectbox("Оберіть тест для редагування:", page_model["titles"])
     
-    selected_test = next(t for t in all_tests if t.title == selected_title)
+    selected_test = management_service.find_test_by_id(page_model["id_by_title"][selected_title])
 
     with st.container(border=True):
         st.subheader(f"Налаштування тесту: {selected_test.title}")
         with st.form(f"edit_test_{selected_test.id}"):
             edit_title = st.text_input("Назва", value=selected_test.title)
             edit_time = st.number_input("Час на питання", min_value=10, value=selected_test.time_per_question)
+            edit_count = st.number_input("Кількість питань за спробу (0 — усі)", min_value=0,
+                                         value=selected_test.questions_per_attempt or 0)
+            stratify_options = {"Без стратифікації": None, "За тегом": "tag", "За складністю": "difficulty"}
+            stratify_labels = list(stratify_options)
+            edit_stratify = st.selectbox("Вибірка питань", stratify_labels,
+                                         index=list(stratify_options.values()).index(selected_test.stratify_by))
             
             if st.form_submit_button("Зберегти налаштування"):
-                management_service.edit_test_settings(selected_test.id, edit_title, edit_time)
+                management_service.edit_test_settings(selected_test.id, edit_title, edit_time,
+                                                      edit_count or None, stratify_options[edit_stratify])
                 if safe_save_changes():
                     st.success("Налаштування оновлено.")
                     st.rerun()
@@ -89,6 +117,10 @@ def page_admin():
             with st.form(f"edit_q_form_{q.id}"):
 
                 new_q_text = st.text_area("Текст питання:", value=q.text)
+                tag_col, difficulty_col = st.columns(2)
+                new_q_tag = tag_col.text_input("Тег", value=q.tag or "")
+                new_q_difficulty = difficulty_col.number_input("Складність (0 — не задано)", min_value=0,
+                                                               value=q.difficulty or 0)
                 
                 st.write("**Відповіді:**")
                 correct_answer_id = next((ans.id for ans in q.answers if ans.is_correct), None)
@@ -116,6 +148,8 @@ def page_admin():
                 col1, col2 = st.columns(2)
                 if col1.form_submit_button("Зберегти зміни питання"):
                     management_service.edit_question(selected_test.id, q.id, new_q_text)
+                    management_service.edit_question_classification(selected_test.id, q.id,
+                                                                    new_q_tag.strip(), new_q_difficulty)
                     if safe_save_changes():
                         st.success("Питання оновлено.")
                         st.rerun()
@@ -159,9 +193,13 @@ def page_admin():
 
     with st.form(f"add_q_form_{selected_test.id}", clear_on_submit=True):
         new_q_text = st.text_input("Текст нового питання:")
+        tag_col, difficulty_col = st.columns(2)
+        new_q_tag = tag_col.text_input("Тег нового питання")
+        new_q_difficulty = difficulty_col.number_input("Складність нового питання (0 — не задано)", min_value=0)
         if st.form_submit_button("➕ Додати питання до тесту"):
             if new_q_text:
-                management_service.add_question(selected_test.id, new_q_text)
+                management_service.add_question(selected_test.id, new_q_text,
+                                                new_q_tag.strip() or None, new_q_difficulty or None)
                 if safe_save_changes():
                     st.success("Питання додано.")
                     st.rerun()
@@ -170,21 +208,22 @@ def page_admin():
 
 def page_student():
     st.title("Проходження тесту (Режим Студента)")
+    management_service = load_service(get_management_service)
+    stats_service = load_service(get_stats_service)
 
     if 'testing_session' not in st.session_state:
         st.info("Ласкаво просимо! Оберіть тест, щоб почати.")
         
-        all_tests = management_service.get_all_tests()
-        if not all_tests:
+        page_model = get_page_model(management_service, management_service.catalog_id, management_service.catalog_version)
+        if not page_model["titles"]:
             st.warning("На жаль, ще немає доступних тестів.")
             return
 
-        test_titles = [t.title for t in all_tests]
-        selected_title = st.selectbox("Оберіть тест:", test_titles)
+        selected_title = st.selectbox("Оберіть тест:", page_model["titles"])
         student_name = st.text_input("Ваше ім'я (для статистики):", "Анонім")
 
         if st.button("Почати тестування"):
-            selected_test = next(t for t in all_tests if t.title == selected_title)
+            selected_test = management_service.find_test_by_id(page_model["id_by_title"][selected_title])
             
             try:
                 testing_session = TestingService(selected_test)
@@ -207,8 +246,9 @@ def page_student():
             st.subheader(f"Тест: {testing_session.test.title}")
             st.markdown(f"**Питання:**\n> {q.text}")
             
-            answer_texts = [ans.text for ans in q.answers]
-            answer_ids = [ans.id for ans in q.answers]
+            answers = testing_session.get_answers(q)
+            answer_texts = [ans.text for ans in answers]
+            answer_ids = [ans.id for ans in answers]
             
             selected_answer_text = st.radio("Оберіть відповідь:", 
                                             answer_texts, 
@@ -260,8 +300,13 @@ def page_student():
 
 def page_statistics():
     st.title("Загальна статистика тестів")
+    stats_service = load_service(get_stats_service)
     
-    stats = stats_service.get_test_statistics()
+    try:
+        stats = stats_service.get_test_statistics()
+    except DataAccessError as e:
+        st.error(f"Не вдалося прочитати статистику: {e}")
+        return
     
     if not stats:
         st.info("Поки що немає жодних результатів для відображення.")
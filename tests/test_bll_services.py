@@ -7,8 +7,8 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
 from bll.services import TestManagementService, StatisticsService, TestingService
-from bll.exceptions import TestNotFoundError, InvalidTestError
-from bll.models import Test, Question, Answer
+from bll.exceptions import TestNotFoundError, InvalidTestError, QuestionValidationError
+from bll.models import Test, Question, Answer, TestResult
 from dal.repository import FileRepository
 
 class TestTestManagementService(unittest.TestCase):
@@ -41,6 +41,7 @@ class TestTestManagementService(unittest.TestCase):
 
         saved_list = self.mock_repo.save_all_tests.call_args[0][0]
         self.assertIn(test, saved_list)
+        self.assertEqual(self.mock_repo.save_all_tests.call_args[1]["dirty_ids"], {test.id})
 
     def test_get_test_by_id_raises_not_found_error(self):
         invalid_id = "non_existing_id"
@@ -48,6 +49,21 @@ class TestTestManagementService(unittest.TestCase):
         with self.assertRaises(TestNotFoundError):
             self.service.find_test_by_id(invalid_id)
 
+    def test_catalog_version_changes_with_titles(self):
+        version = self.service.catalog_version
+        test = self.service.create_test("Тест", 60)
+        self.assertGreater(self.service.catalog_version, version)
+
+        version = self.service.catalog_version
+        self.service.edit_test_settings(test.id, "Нова назва", 60)
+        self.assertGreater(self.service.catalog_version, version)
+        self.assertIs(self.service.find_test_by_id(test.id), test)
+
+    def test_catalog_id_differs_between_instances(self):
+        other = TestManagementService(self.mock_repo)
+
+        self.assertNotEqual(other.catalog_id, self.service.catalog_id)
+
     def test_add_question_to_test(self):
         test = self.service.create_test("Тест з питаннями", 60)
         question_text = "Скільки буде 2+2?"
@@ -71,6 +87,82 @@ class TestTestManagementService(unittest.TestCase):
         self.assertEqual(new_answer.is_correct, is_correct)
         self.assertIn(new_answer, q.answers)
 
+    def test_save_changes_rejects_question_without_correct_answer(self):
+        test = self.service.create_test("Тест з помилкою", 60)
+        q = self.service.add_question(test.id, "Питання без правильної")
+        self.service.add_answer(test.id, q.id, "Неправильна", False)
+
+        with self.assertRaises(QuestionValidationError):
+            self.service.save_changes()
+        self.mock_repo.save_all_tests.assert_not_called()
+
+    def test_save_changes_allows_question_without_answers(self):
+        test = self.service.create_test("Тест з порожнім питанням", 60)
+        self.service.add_question(test.id, "Поки без відповідей")
+
+        self.service.save_changes()
+
+        self.mock_repo.save_all_tests.assert_called_once()
+
+    def test_validation_tracks_answer_edits_and_removal(self):
+        test = self.service.create_test("Тест", 60)
+        q = self.service.add_question(test.id, "Питання")
+        wrong = self.service.add_answer(test.id, q.id, "Неправильна", False)
+
+        self.service.edit_answer(test.id, q.id, wrong.id, "Тепер правильна", True)
+        self.service.save_changes()
+
+        right = self.service.add_answer(test.id, q.id, "Ще одна", True)
+        self.service.remove_answer(test.id, q.id, right.id)
+        self.service.edit_answer(test.id, q.id, wrong.id, "Знову неправильна", False)
+        with self.assertRaises(QuestionValidationError):
+            self.service.save_changes()
+
+        self.service.remove_question(test.id, q.id)
+        self.assertIsNone(test.find_invalid_question())
+
+    def test_validation_reports_first_invalid_question(self):
+        test = self.service.create_test("Тест", 60)
+        first = self.service.add_question(test.id, "AAA")
+        second = self.service.add_question(test.id, "BBB")
+        first_wrong = self.service.add_answer(test.id, first.id, "Неправильна", False)
+        self.service.add_answer(test.id, second.id, "Неправильна", False)
+
+        self.service.edit_answer(test.id, first.id, first_wrong.id, "Інший текст", False)
+
+        with self.assertRaisesRegex(QuestionValidationError, "AAA"):
+            self.service.save_changes()
+
+    def test_questions_and_answers_are_read_only_views(self):
+        test = self.service.create_test("Тест", 60)
+        q = self.service.add_question(test.id, "Питання")
+
+        with self.assertRaises(AttributeError):
+            test.questions.append(Question("Поза трекінгом"))
+        with self.assertRaises(AttributeError):
+            q.answers.append(Answer("Поза трекінгом", is_correct=True))
+
+
+class TestStatisticsService(unittest.TestCase):
+
+    def test_get_test_statistics_aggregates_streamed_results(self):
+        mock_repo = Mock(spec=FileRepository)
+        test_a = Test("Тест A", 60)
+        test_b = Test("Тест B", 60)
+        mock_repo.load_all_tests.return_value = [test_a, test_b]
+        mock_repo.iter_statistics.return_value = iter([
+            TestResult(test_a.title, test_a.id, 50.0),
+            TestResult(test_a.title, test_a.id, 100.0),
+        ])
+
+        stats = StatisticsService(mock_repo).get_test_statistics()
+
+        self.assertEqual(stats, [
+            {"title": "Тест A", "attempts": 2, "average_score": 75.0},
+            {"title": "Тест B", "attempts": 0, "average_score": 0},
+        ])
+        mock_repo.load_statistics.assert_not_called()
+
 
 class TestTestingService(unittest.TestCase):
 
@@ -93,6 +185,73 @@ class TestTestingService(unittest.TestCase):
         with self.assertRaises(InvalidTestError):
             TestingService(empty_test)
             
+    def test_start_test_with_unconfigured_question_raises_error(self):
+        q3 = Question("Питання 3")
+        q3.add_answer(Answer("Неправильна 3", is_correct=False))
+        self.test.add_question(q3)
+
+        with self.assertRaises(InvalidTestError):
+            TestingService(self.test)
+
+    def test_loaded_test_is_validated(self):
+        data = self.test.to_dict()
+        data["questions"][0]["answers"] = []
+
+        with self.assertRaises(InvalidTestError):
+            TestingService(Test.from_dict(data))
+
+    def test_draws_configured_number_of_questions(self):
+        pool = Test("Великий банк", 60, questions_per_attempt=5)
+        for i in range(50):
+            q = Question(f"Питання {i}")
+            q.add_answer(Answer("Так", is_correct=True))
+            pool.add_question(q)
+
+        service = TestingService(pool)
+        drawn = []
+        q = service.get_next_question()
+        while q:
+            drawn.append(q)
+            service.submit_answer(q.id, q.answers[0].id)
+            q = service.get_next_question()
+
+        self.assertEqual(len(drawn), 5)
+        self.assertEqual(len({q.id for q in drawn}), 5)
+        self.assertEqual(service.calculate_results(), {"percent": 100.0, "correct": 5, "total": 5})
+
+    def test_stratified_draw_is_proportional(self):
+        pool = Test("Стратифікований банк", 60)
+        for i in range(30):
+            q = Question(f"Питання {i}", tag="легкі" if i < 20 else "складні")
+            q.add_answer(Answer("Так", is_correct=True))
+            pool.add_question(q)
+
+        drawn = pool.draw_questions(6, stratify_by="tag")
+
+        tags = [q.tag for q in drawn]
+        self.assertEqual(tags.count("легкі"), 4)
+        self.assertEqual(tags.count("складні"), 2)
+
+    def test_unknown_stratify_by_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Test("Тест", 60, stratify_by="colour")
+
+        data = self.test.to_dict()
+        data["stratify_by"] = "colour"
+        self.assertIsNone(Test.from_dict(data).stratify_by)
+
+    def test_reclassified_questions_change_strata(self):
+        service = TestManagementService(Mock(spec=FileRepository, **{"load_all_tests.return_value": [self.test]}))
+        q1, q2 = self.test.questions
+        self.assertEqual(len(self.test.draw_questions(2, stratify_by="tag")), 2)
+
+        service.edit_question_classification(self.test.id, q1.id, "А", 1)
+        service.edit_question_classification(self.test.id, q2.id, "Б", None)
+
+        drawn = self.test.draw_questions(2, stratify_by="tag")
+        self.assertEqual(sorted(q.tag for q in drawn), ["А", "Б"])
+        self.assertEqual(q1.difficulty, 1)
+
     def test_calculate_results_100_percent(self):
         service = TestingService(self.test)
 
@@ -0,0 +1,435 @@
+﻿import unittest
+from unittest.mock import patch
+import gzip
+import json
+import tempfile
+import shutil
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from bll.models import Test, Question, Answer, TestResult
+from bll.services import StatisticsService
+from dal.repository import ShardedRepository, FileRepository, CachingRepository, StatisticsFilter, DataAccessError
+from dal.codecs import JsonCodec, GzipCodec, CodecMismatchError, migrate_file
+
+class TestShardedRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.repo = ShardedRepository(self.root, shard_count=4)
+
+    def tearDown(self):
+        self.repo.close()
+        shutil.rmtree(self.root)
+
+    def _make_tests(self, count):
+        tests = []
+        for i in range(count):
+            test = Test(f"Тест {i}", 60)
+            q = Question(f"Питання {i}")
+            q.add_answer(Answer("Так", is_correct=True))
+            test.add_question(q)
+            tests.append(test)
+        return tests
+
+    def test_save_and_load_preserves_order(self):
+        tests = self._make_tests(10)
+
+        self.repo.save_all_tests(tests)
+        loaded = ShardedRepository(self.root).load_all_tests()
+
+        self.assertEqual([t.id for t in loaded], [t.id for t in tests])
+        self.assertEqual(loaded[3].questions[0].answers[0].text, "Так")
+
+    def test_save_rewrites_only_affected_shard(self):
+        tests = self._make_tests(10)
+        self.repo.save_all_tests(tests)
+        tests = self.repo.load_all_tests()
+
+        changed = tests[0]
+        changed_path = self.repo._tests_shard_path(self.repo.shard_for(changed.id))
+        mtimes = {path: os.stat(path).st_mtime_ns
+                  for path in (self.repo._tests_shard_path(i) for i in range(4))
+                  if os.path.exists(path)}
+        for path in mtimes:
+            os.utime(path, ns=(0, 0))
+
+        changed.title = "Змінений тест"
+        self.repo.save_all_tests(tests, dirty_ids={changed.id})
+
+        for path in mtimes:
+            if path == changed_path:
+                self.assertNotEqual(os.stat(path).st_mtime_ns, 0)
+            else:
+                self.assertEqual(os.stat(path).st_mtime_ns, 0)
+
+    def test_save_without_changes_writes_nothing(self):
+        tests = self._make_tests(6)
+        self.repo.save_all_tests(tests)
+        for i in range(4):
+            path = self.repo._tests_shard_path(i)
+            if os.path.exists(path):
+                os.utime(path, ns=(0, 0))
+
+        self.repo.save_all_tests(tests, dirty_ids=set())
+
+        for i in range(4):
+            path = self.repo._tests_shard_path(i)
+            if os.path.exists(path):
+                self.assertEqual(os.stat(path).st_mtime_ns, 0)
+
+    def test_sequential_thread_and_process_loading_agree(self):
+        tests = self._make_tests(12)
+        self.repo.save_all_tests(tests)
+
+        with ShardedRepository(self.root, max_workers=1) as repo:
+            sequential = repo.load_all_tests()
+        with ShardedRepository(self.root, max_workers=2) as repo:
+            threads = repo.load_all_tests()
+        with ShardedRepository(self.root, max_workers=2, use_processes=True) as repo:
+            processes = repo.load_all_tests()
+
+        self.assertEqual([t.id for t in sequential], [t.id for t in threads])
+        self.assertEqual([t.id for t in sequential], [t.id for t in processes])
+
+    def test_executor_is_reused_until_closed(self):
+        self.repo.save_all_tests(self._make_tests(12))
+        repo = ShardedRepository(self.root, max_workers=2)
+
+        repo.load_all_tests()
+        executor = repo._executor
+        repo.load_statistics()
+        repo.load_all_tests()
+        self.assertIs(repo._executor, executor)
+
+        repo.close()
+        self.assertIsNone(repo._executor)
+
+    def test_bulk_statistics_are_routed_to_shards(self):
+        results = [TestResult(f"Тест {i}", f"id-{i}", i) for i in range(10)]
+
+        self.repo.save_statistics(results)
+
+        loaded = sorted(self.repo.load_statistics(), key=lambda r: r.score_percent)
+        self.assertEqual([r.test_id for r in loaded], [r.test_id for r in results])
+        for result in results:
+            filtered = list(self.repo.iter_statistics(StatisticsFilter(test_ids={result.test_id})))
+            self.assertEqual([r.test_id for r in filtered], [result.test_id])
+
+    def test_corrupted_stats_shard_is_not_overwritten(self):
+        result = TestResult("Тест", "id", 50.0)
+        path = self.repo._stats_shard_path(self.repo.shard_for(result.test_id))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('[{"test_id": "id"')
+
+        with self.assertRaises(DataAccessError):
+            self.repo.save_statistic(result)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '[{"test_id": "id"')
+
+    def test_removed_test_is_dropped_from_shard(self):
+        tests = self._make_tests(3)
+        self.repo.save_all_tests(tests)
+
+        self.repo.save_all_tests(tests[1:])
+
+        loaded = self.repo.load_all_tests()
+        self.assertEqual([t.id for t in loaded], [t.id for t in tests[1:]])
+
+    def test_statistics_are_partitioned_by_test_id(self):
+        tests = self._make_tests(5)
+        for test in tests:
+            self.repo.save_statistic(TestResult(test.title, test.id, 50.0, "Студент"))
+        self.repo.save_statistic(TestResult(tests[0].title, tests[0].id, 100.0, "Студент"))
+
+        results = self.repo.load_statistics()
+
+        self.assertEqual(len(results), 6)
+        first_test_scores = sorted(r.score_percent for r in results if r.test_id == tests[0].id)
+        self.assertEqual(first_test_scores, [50.0, 100.0])
+
+    def test_iter_statistics_reads_only_requested_shards(self):
+        tests = self._make_tests(8)
+        for test in tests:
+            self.repo.save_statistic(TestResult(test.title, test.id, 40.0))
+        target = tests[2]
+        for shard in range(4):
+            if shard != self.repo.shard_for(target.id):
+                with open(self.repo._stats_shard_path(shard), 'w', encoding='utf-8') as f:
+                    f.write("not json")
+
+        results = list(self.repo.iter_statistics(StatisticsFilter(test_ids=[target.id])))
+
+        self.assertEqual([r.test_id for r in results], [target.id])
+
+
+class TestFileRepositoryStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.repo = FileRepository(os.path.join(self.root, "data_tests.json"),
+                                   os.path.join(self.root, "data_stats.json"))
+        self.repo.save_statistic(TestResult("Старий", "a", 10.0))
+        self.repo.save_statistic(TestResult("A", "a", 20.0, completed_at=100.0))
+        self.repo.save_statistic(TestResult("A", "a", 30.0, completed_at=200.0))
+        self.repo.save_statistic(TestResult("B", "b", 40.0, completed_at=150.0))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_iter_statistics_is_lazy_and_unfiltered_by_default(self):
+        results = self.repo.iter_statistics()
+
+        self.assertEqual(next(results).score_percent, 10.0)
+        self.assertEqual([r.score_percent for r in results], [20.0, 30.0, 40.0])
+
+    def test_iter_statistics_filters_by_test_and_time(self):
+        flt = StatisticsFilter(test_ids=["a"], since=100.0, until=200.0)
+
+        self.assertEqual([r.score_percent for r in self.repo.iter_statistics(flt)], [20.0])
+
+    def test_codec_mismatch_does_not_wipe_history(self):
+        stats_file = self.repo.stats_file_path
+        with open(stats_file, 'rb') as f:
+            original = f.read()
+        gzip_repo = FileRepository(self.repo.tests_file_path, stats_file, codec=GzipCodec())
+
+        with self.assertRaises(DataAccessError):
+            gzip_repo.load_statistics()
+        with self.assertRaises(DataAccessError):
+            gzip_repo.save_statistic(TestResult("Новий", "c", 50.0))
+
+        with open(stats_file, 'rb') as f:
+            self.assertEqual(f.read(), original)
+
+    def test_truncated_statistics_are_not_overwritten(self):
+        stats_file = self.repo.stats_file_path
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            truncated = f.read()[:-20]
+        with open(stats_file, 'w', encoding='utf-8') as f:
+            f.write(truncated)
+
+        with self.assertRaises(DataAccessError):
+            self.repo.save_statistic(TestResult("Новий", "c", 50.0))
+
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), truncated)
+        self.assertFalse(os.path.exists(stats_file + ".tmp"))
+
+
+class TestCachingRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.tests_file = os.path.join(self.root, "data_tests.json")
+        self.stats_file = os.path.join(self.root, "data_stats.json")
+        self.inner = FileRepository(self.tests_file, self.stats_file)
+        self.repo = CachingRepository(self.inner)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_repeated_reads_hit_cache(self):
+        self.inner.save_all_tests([Test("Тест", 60)])
+
+        first = self.repo.load_all_tests()
+        second = self.repo.load_all_tests()
+
+        self.assertEqual(first[0].id, second[0].id)
+        self.assertEqual(self.repo.cache_info()["misses"], 1)
+        self.assertEqual(self.repo.cache_info()["hits"], 1)
+
+    def test_save_all_tests_invalidates_cache(self):
+        self.repo.load_all_tests()
+
+        self.repo.save_all_tests([Test("Новий тест", 60)])
+
+        self.assertEqual([t.title for t in self.repo.load_all_tests()], ["Новий тест"])
+        self.assertEqual(self.repo.cache_info()["misses"], 2)
+
+    def test_external_file_change_invalidates_cache(self):
+        self.repo.load_all_tests()
+
+        FileRepository(self.tests_file, self.stats_file).save_all_tests([Test("Зовнішній", 60)])
+        os.utime(self.tests_file, ns=(1, 1))
+
+        self.assertEqual([t.title for t in self.repo.load_all_tests()], ["Зовнішній"])
+
+    def test_save_statistic_invalidates_cached_results(self):
+        self.repo.load_statistics()
+
+        self.repo.save_statistic(TestResult("Тест", "test-id", 75.0, "Студент"))
+        results = self.repo.load_statistics()
+
+        self.assertEqual([r.score_percent for r in results], [75.0])
+        self.assertEqual(self.repo.cache_info()["misses"], 2)
+
+    def test_cached_tests_are_not_shared_between_callers(self):
+        test = Test("Тест", 60)
+        q = Question("Питання")
+        q.add_answer(Answer("Так", is_correct=True))
+        q.add_answer(Answer("Ні"))
+        test.add_question(q)
+        self.inner.save_all_tests([test])
+
+        first = self.repo.load_all_tests()
+        first[0].title = "Незбережена зміна"
+        first[0].questions[0].answers = reversed(first[0].questions[0].answers)
+        second = self.repo.load_all_tests()
+
+        self.assertEqual(second[0].title, "Тест")
+        self.assertEqual([a.text for a in second[0].questions[0].answers], ["Так", "Ні"])
+        self.assertEqual(self.repo.cache_info()["hits"], 1)
+
+    def test_repeated_statistics_pages_read_disk_once(self):
+        self.inner.save_all_tests([Test("Тест", 60)])
+        self.inner.save_statistic(TestResult("Тест", "id", 60.0))
+        service = StatisticsService(self.repo)
+
+        with patch.object(self.inner, "iter_statistics", wraps=self.inner.iter_statistics) as streamed, \
+                patch.object(self.inner, "load_all_tests", wraps=self.inner.load_all_tests) as loaded:
+            first = service.get_test_statistics()
+            second = service.get_test_statistics()
+
+        self.assertEqual(first, second)
+        self.assertEqual(streamed.call_count, 1)
+        self.assertEqual(loaded.call_count, 1)
+        self.assertEqual(self.repo.cache_info()["size"], 1)
+
+    def test_statistics_aggregate_follows_new_results(self):
+        test = Test("Тест", 60)
+        self.inner.save_all_tests([test])
+        service = StatisticsService(self.repo)
+        service.record_result(test.id, test.title, 50.0, "Студент")
+        self.assertEqual(service.get_test_statistics()[0]["attempts"], 1)
+
+        service.record_result(test.id, test.title, 100.0, "Студент")
+
+        self.assertEqual(service.get_test_statistics(),
+                         [{"title": "Тест", "attempts": 2, "average_score": 75.0}])
+
+    def test_large_statistics_stream_is_not_cached(self):
+        repo = CachingRepository(self.inner, max_items=1)
+        self.inner.save_statistic(TestResult("Тест", "id", 60.0))
+        self.inner.save_statistic(TestResult("Тест", "id", 70.0))
+
+        self.assertEqual(len(list(repo.iter_statistics())), 2)
+        self.assertEqual(len(list(repo.iter_statistics())), 2)
+
+        self.assertEqual(repo.cache_info()["misses"], 2)
+        self.assertEqual(repo.cache_info()["size"], 0)
+
+    def test_loaded_statistics_respect_item_bound(self):
+        repo = CachingRepository(self.inner, max_items=1)
+        for score in range(5):
+            self.inner.save_statistic(TestResult("Тест", "id", score))
+
+        self.assertEqual(len(repo.load_statistics()), 5)
+        self.assertEqual(len(repo.load_statistics()), 5)
+
+        self.assertEqual(repo.cache_info()["misses"], 2)
+        self.assertEqual(repo.cache_info()["size"], 0)
+
+    def test_least_recently_used_kind_is_evicted(self):
+        repo = CachingRepository(self.inner, max_items=3)
+        self.inner.save_all_tests([Test("Тест 1", 60), Test("Тест 2", 60)])
+        self.inner.save_statistic(TestResult("Тест 1", "id", 60.0))
+        self.inner.save_statistic(TestResult("Тест 1", "id", 70.0))
+
+        repo.load_all_tests()
+        repo.load_statistics()
+        self.assertEqual(repo.cache_info()["entries"], 1)
+        self.assertEqual(repo.cache_info()["size"], 2)
+
+        repo.load_statistics()
+        repo.load_all_tests()
+        self.assertEqual(repo.cache_info()["hits"], 1)
+        self.assertEqual(repo.cache_info()["misses"], 3)
+
+
+class TestStorageCodecs(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_default_codec_keeps_indented_json_format(self):
+        path = os.path.join(self.root, "data.json")
+        items = [{"id": "1", "text": "Питання", "answers": [{"is_correct": True}]}, {"id": "2"}]
+
+        JsonCodec().write_items(path, items)
+
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), json.dumps(items, indent=4, ensure_ascii=False))
+
+    def test_mismatched_codec_is_detected_by_magic_bytes(self):
+        path = os.path.join(self.root, "data.json.gz")
+        GzipCodec().write_items(path, [{"id": "1"}])
+
+        with self.assertRaises(CodecMismatchError):
+            JsonCodec().read_items(path)
+        self.assertEqual(GzipCodec().read_items(path), [{"id": "1"}])
+
+    def test_streaming_decode_with_small_chunks(self):
+        path = os.path.join(self.root, "data.json.gz")
+        items = [{"id": str(i), "text": "ї" * i} for i in range(100)]
+        codec = GzipCodec()
+        codec.write_items(path, items)
+
+        self.assertEqual(list(codec.iter_items(path, chunk_size=7)), items)
+
+    def test_multi_chunk_item_is_read_in_growing_chunks(self):
+        path = os.path.join(self.root, "tests.json")
+        item = {"id": "big", "questions": [{"text": "Питання %d" % i, "answers": []} for i in range(20000)]}
+        JsonCodec().write_items(path, [item, {"id": "small"}])
+        reads = []
+
+        class CountingCodec(JsonCodec):
+            def open(self, file_path, mode):
+                f = super().open(file_path, mode)
+                original_read = f.read
+                f.read = lambda size=-1: reads.append(size) or original_read(size)
+                return f
+
+        items = list(CountingCodec().iter_items(path, chunk_size=1024))
+
+        self.assertEqual([i["id"] for i in items], ["big", "small"])
+        self.assertLess(len(reads), 20)
+
+    def test_file_repository_with_gzip_codec(self):
+        repo = FileRepository(os.path.join(self.root, "tests.json.gz"),
+                              os.path.join(self.root, "stats.json.gz"), codec=GzipCodec())
+        repo.save_all_tests([Test("Стиснений тест", 60)])
+        repo.save_statistic(TestResult("Стиснений тест", "id-1", 80.0))
+        repo.save_statistic(TestResult("Стиснений тест", "id-1", 90.0))
+
+        with gzip.open(repo.tests_file_path, 'rt', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)[0]["title"], "Стиснений тест")
+        self.assertEqual([r.score_percent for r in repo.load_statistics()], [80.0, 90.0])
+
+    def test_corrupted_file_loads_as_empty(self):
+        path = os.path.join(self.root, "stats.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('[{"test_title": "Т"')
+        repo = FileRepository(os.path.join(self.root, "tests.json"), path)
+
+        self.assertEqual(repo.load_statistics(), [])
+
+    def test_migrate_file_between_codecs(self):
+        src = os.path.join(self.root, "stats.json")
+        dst = os.path.join(self.root, "stats.json.gz")
+        items = [{"id": str(i)} for i in range(10)]
+        JsonCodec().write_items(src, items)
+
+        migrate_file(src, JsonCodec(), dst, GzipCodec())
+
+        self.assertEqual(GzipCodec().read_items(dst), items)
+
+if __name__ == '__main__':
+    unittest.main()
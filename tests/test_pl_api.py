@@ -0,0 +1,181 @@
+﻿import unittest
+import unittest.mock
+import asyncio
+import tempfile
+import shutil
+import threading
+import sys
+import os
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from bll.models import Test, Question, Answer, TestResult
+from bll.services import TestManagementService
+from dal.repository import FileRepository
+from pl.api import GradingApi
+
+class TestGradingApi(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.repo = FileRepository(os.path.join(self.root, "data_tests.json"),
+                                   os.path.join(self.root, "data_stats.json"))
+        self.test = Test("API тест", 60)
+        for i in range(3):
+            q = Question(f"Питання {i}")
+            q.add_answer(Answer("Правильна", is_correct=True))
+            q.add_answer(Answer("Неправильна", is_correct=False))
+            self.test.add_question(q)
+        self.repo.save_all_tests([self.test])
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _run(self, coro):
+        return asyncio.run(coro)
+
+    def test_full_session_records_result(self):
+        async def scenario():
+            api = GradingApi(self.repo)
+            status, started = await api.handle("POST", "/sessions", {"test_id": self.test.id, "student_name": "Бот"})
+            self.assertEqual(status, 200)
+            self.assertEqual(started["total"], 3)
+
+            session_path = f"/sessions/{started['session_id']}"
+            while True:
+                _, payload = await api.handle("POST", session_path + "/next", {})
+                question = payload["question"]
+                if question is None:
+                    break
+                answers = next(q for q in self.test.questions if q.id == question["id"]).answers
+                answer_id = next(a.id for a in answers if a.is_correct)
+                status, _ = await api.handle("POST", session_path + "/answer",
+                                             {"question_id": question["id"], "answer_id": answer_id})
+                self.assertEqual(status, 200)
+
+            status, results = await api.handle("POST", session_path + "/finish", {})
+            self.assertEqual(results, {"percent": 100.0, "correct": 3, "total": 3})
+
+            status, _ = await api.handle("POST", session_path + "/next", {})
+            self.assertEqual(status, 404)
+
+            _, stats = await api.handle("GET", "/stats", {})
+            self.assertEqual(stats["statistics"][0]["attempts"], 1)
+
+        self._run(scenario())
+
+    def test_unknown_test_returns_404(self):
+        async def scenario():
+            api = GradingApi(self.repo)
+            status, payload = await api.handle("POST", "/sessions", {"test_id": "missing"})
+            self.assertEqual(status, 404)
+            self.assertIn("error", payload)
+
+        self._run(scenario())
+
+    def test_answer_for_other_question_is_rejected(self):
+        async def scenario():
+            api = GradingApi(self.repo)
+            _, started = await api.handle("POST", "/sessions", {"test_id": self.test.id})
+            status, _ = await api.handle("POST", f"/sessions/{started['session_id']}/answer",
+                                         {"question_id": "other", "answer_id": "other"})
+            self.assertEqual(status, 409)
+
+        self._run(scenario())
+
+    def test_catalog_is_reused_until_tests_file_changes(self):
+        async def scenario():
+            api = GradingApi(self.repo)
+            with unittest.mock.patch("pl.api.TestManagementService", wraps=TestManagementService) as built:
+                await api.handle("GET", "/tests", {})
+                await api.handle("POST", "/sessions", {"test_id": self.test.id})
+                self.assertEqual(built.call_count, 1)
+
+                self.repo.save_all_tests([self.test, Test("Новий тест", 30)])
+                os.utime(self.repo.tests_file_path, ns=(1, 1))
+                _, payload = await api.handle("GET", "/tests", {})
+                self.assertEqual(built.call_count, 2)
+                self.assertEqual(len(payload["tests"]), 2)
+
+        self._run(scenario())
+
+    def test_sessions_do_not_reorder_shared_answers(self):
+        async def scenario():
+            api = GradingApi(self.repo)
+            catalog = await api._load_catalog()
+            original = [[a.id for a in q.answers] for q in catalog.get_all_tests()[0].questions]
+
+            for _ in range(5):
+                _, started = await api.handle("POST", "/sessions", {"test_id": self.test.id})
+                for _ in range(3):
+                    await api.handle("POST", f"/sessions/{started['session_id']}/next", {})
+
+            self.assertIs(await api._load_catalog(), catalog)
+            self.assertEqual([[a.id for a in q.answers] for q in catalog.get_all_tests()[0].questions], original)
+
+        self._run(scenario())
+
+    def _raw_request(self, api, request: bytes) -> bytes:
+        async def scenario():
+            server = await asyncio.start_server(api.handle_connection, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        return self._run(scenario())
+
+    def test_invalid_content_length_returns_400(self):
+        response = self._raw_request(GradingApi(self.repo),
+                                     b"POST /sessions HTTP/1.1\r\nContent-Length: abc\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+
+        response = self._raw_request(GradingApi(self.repo),
+                                     b"POST /sessions HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+
+    def test_malformed_request_line_returns_400(self):
+        response = self._raw_request(GradingApi(self.repo), b"GARBAGE\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 400"))
+
+    def test_oversized_header_returns_431(self):
+        response = self._raw_request(GradingApi(self.repo),
+                                     b"GET /tests HTTP/1.1\r\nX-Long: " + b"a" * 70_000 + b"\r\n\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 431"))
+
+        many_headers = b"".join(f"X-H{i}: 1\r\n".encode() for i in range(200))
+        response = self._raw_request(GradingApi(self.repo), b"GET /tests HTTP/1.1\r\n" + many_headers + b"\r\n")
+        self.assertTrue(response.startswith(b"HTTP/1.1 431"))
+
+    def test_domain_value_error_is_not_reported_as_bad_json(self):
+        async def scenario():
+            api = GradingApi(self.repo)
+            with unittest.mock.patch.object(Test, "draw_questions", side_effect=ValueError("Невідоме поле")):
+                status, payload = await api.handle("POST", "/sessions", {"test_id": self.test.id})
+            self.assertEqual(status, 400)
+            self.assertEqual(payload["error"], "Невідоме поле")
+
+        self._run(scenario())
+
+    def test_concurrent_result_writes_are_not_lost(self):
+        def write(n):
+            repo = FileRepository(self.repo.tests_file_path, self.repo.stats_file_path)
+            for i in range(10):
+                repo.save_statistic(TestResult("API тест", self.test.id, float(n * 10 + i)))
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.repo.load_statistics()), 40)
+
+if __name__ == '__main__':
+    unittest.main()